@@ -0,0 +1,394 @@
+import time
+import queue
+import logging
+import threading
+import functools
+import multiprocessing
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from ..json_process.json_validation import get_input_events_list
+from ..geodata_process.geocode_place import is_string_address, get_coords_by_address
+from ..folium_mapping.folium_maps import get_map_with_events
+from ..performance_monitoring.metrics import timer
+
+
+logger = logging.getLogger("infapi.plugins")
+
+# Marker of the end of the stream
+_END = object()
+
+# Name of the pseudo-stage reported when iterating the input items fails
+INPUT_STAGE_NAME = "<input>"
+
+
+class PipelineError(Exception):
+    pass
+
+
+class StageFailure:
+    """
+    Failure of the item: the exception raised by the stage function (the later stages
+    pass it as is, 'run' yields it in place of the item output)
+    Parameters:
+        - stage_name as (str): name of the failed stage
+        - error as (Exception): the raised exception
+    """
+
+    def __init__(self, stage_name, error):
+        self.stage_name = stage_name
+        self.error = error
+
+
+class Stage:
+    """
+    Pipeline stage: function applied to every item of the stream
+    Parameters:
+        - name as (str): stage name (used in the stats)
+        - func as (callable): function of one argument (must be picklable for "cpu" stages)
+        - kind as (str): "cpu" (runs in a process pool) or "io" (runs in a thread pool)
+        - workers as (int): number of the pool workers
+        - queue_size as (int): capacity of the stage input queue
+    """
+
+    def __init__(self, name, func, kind="io", workers=4, queue_size=16):
+        if kind not in ("cpu", "io"):
+            raise ValueError("Stage kind must be 'cpu' or 'io'!")
+        self.name = name
+        self.func = func
+        self.kind = kind
+        self.workers = workers
+        self.queue_size = queue_size
+
+
+class StageStats:
+    """
+    Runtime statistics of the pipeline stage
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.processed = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self._queue_depth_sum = 0
+        self._queue_samples = 0
+        self.start_time = None
+        self.finish_time = None
+
+    def observe_queue_depth(self, depth):
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        self._queue_depth_sum += depth
+        self._queue_samples += 1
+
+    @property
+    def avg_queue_depth(self):
+        return self._queue_depth_sum / self._queue_samples if self._queue_samples else 0.0
+
+    @property
+    def throughput(self):
+        """
+        Processed items per second of the stage run time
+        """
+
+        if self.start_time is None:
+            return 0.0
+        elapsed = (self.finish_time or time.perf_counter()) - self.start_time
+
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "processed": self.processed,
+            "errors": self.errors,
+            "throughput": self.throughput,
+            "avg_queue_depth": self.avg_queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+class Pipeline:
+    """
+    Streaming pipeline of stages connected with bounded queues. Every stage keeps
+    at most 'workers' items in flight and blocks on the full output queue, so
+    a slow stage throttles the upstream ones (backpressure). The items' order is kept.
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.stats = {}
+        self._reset_stats()
+        self._stop_event = threading.Event()
+
+    def run(self, items, stop_on_error=False):
+        """
+        Passes the items through the stages
+        Parameters:
+            - items as (iterable): input items of the first stage
+            - stop_on_error as (bool): whether to abort the run raising PipelineError
+                                       on the first failed item
+        Returns:
+            - generator of the outputs of the last stage in the input order; a failed
+              item is yielded as StageFailure (the other items are still processed)
+        """
+
+        self._stop_event.clear()
+        self._reset_stats()
+        queues = [queue.Queue(stage.queue_size) for stage in self.stages]
+        queues.append(queue.Queue(self.stages[-1].queue_size))
+
+        # Process pools start their workers lazily from the stage threads, and forking
+        # a process with running threads may deadlock on the locks copied in a held state
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        mp_context = multiprocessing.get_context(start_method)
+        executors = [
+            ProcessPoolExecutor(stage.workers, mp_context=mp_context) if stage.kind == "cpu"
+            else ThreadPoolExecutor(stage.workers)
+            for stage in self.stages
+        ]
+
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            threads.append(threading.Thread(
+                target=self._run_stage, args=(stage, executors[i], queues[i], queues[i + 1]), daemon=True
+            ))
+        for thread in threads:
+            thread.start()
+
+        output_queue = queues[-1]
+        result = None
+        try:
+            while True:
+                result = output_queue.get()
+                if result is _END:
+                    break
+                if stop_on_error and isinstance(result, StageFailure):
+                    raise PipelineError("Stage '%s' failed: %r" % (result.stage_name, result.error)) \
+                        from result.error
+                yield result
+        finally:
+            # Let the threads finish (the remaining items are skipped by the stages)
+            self._stop_event.set()
+            while result is not _END:
+                result = output_queue.get()
+            for thread in threads:
+                thread.join()
+            for executor in executors:
+                executor.shutdown()
+
+    def _reset_stats(self):
+        self.stats = {stage.name: StageStats(stage.name) for stage in self.stages}
+
+    def _feed(self, items, output_queue):
+        try:
+            for item in items:
+                if self._stop_event.is_set():
+                    break
+                output_queue.put(item)
+        except Exception as e:
+            # Passed through the stages to 'run' as the failure of the input
+            output_queue.put(StageFailure(INPUT_STAGE_NAME, e))
+        finally:
+            output_queue.put(_END)
+
+    def _run_stage(self, stage, executor, input_queue, output_queue):
+        stats = self.stats[stage.name]
+        stats.start_time = time.perf_counter()
+        pending = deque()
+
+        def on_error(e):
+            stats.errors += 1
+            logger.warning("Stage '%s' failed: %s", stage.name, e)
+            return StageFailure(stage.name, e)
+
+        def pass_oldest():
+            future, is_skipped = pending.popleft()
+            try:
+                result = future.result()
+                if not is_skipped:
+                    stats.processed += 1
+            except Exception as e:
+                result = on_error(e)
+            output_queue.put(result)
+
+        is_ended = False
+        try:
+            while True:
+                stats.observe_queue_depth(input_queue.qsize())
+                item = input_queue.get()
+                if item is _END:
+                    is_ended = True
+                    break
+                if isinstance(item, StageFailure) or self._stop_event.is_set():
+                    # Skip the item (failed upstream or the pipeline is stopping)
+                    pending.append((_CompletedItem(item), True))
+                else:
+                    try:
+                        pending.append((executor.submit(stage.func, item), False))
+                    except Exception as e:
+                        # E.g. BrokenProcessPool after a worker process died
+                        pending.append((_CompletedItem(on_error(e)), True))
+                if len(pending) >= stage.workers:
+                    pass_oldest()
+
+            while pending:
+                pass_oldest()
+        except Exception as e:
+            logger.exception("Stage '%s' crashed", stage.name)
+            output_queue.put(StageFailure(stage.name, e))
+        finally:
+            # The upstream stages mustn't block on the full queue, and the downstream
+            # ones (and 'run') wait for the end of the stream in any case
+            while not is_ended:
+                is_ended = input_queue.get() is _END
+            stats.finish_time = time.perf_counter()
+            output_queue.put(_END)
+
+    def get_stats(self):
+        """
+        Returns stats of the stages as dict {stage name: dict of stats}
+        """
+
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+
+class _CompletedItem:
+    """
+    Future-like wrapper of the ready result
+    """
+
+    def __init__(self, result):
+        self._result = result
+
+    def result(self):
+        return self._result
+
+
+def validate_context(context, input_schema):
+    """
+    Pipeline step: returns list of validated events from the input context
+    """
+
+    return get_input_events_list(context, input_schema)
+
+
+def detect_addresses(events_list):
+    """
+    Pipeline step: finds events without coordinates which location name is an address
+    Returns:
+        - (events_list, idx_list) as (tuple): events and indexes of the events to be geocoded
+    """
+
+    idx_list = []
+    for idx, event in enumerate(events_list):
+        attributes = event["attributes"]
+        if attributes["lat"] is None or attributes["lon"] is None:
+            if attributes["location_name"] and is_string_address(attributes["location_name"]):
+                idx_list.append(idx)
+
+    return events_list, idx_list
+
+
+def geocode_addresses(events_and_idx):
+    """
+    Pipeline step: fills coordinates of the given events by their addresses
+    Returns:
+        - events_list as (list of dicts): events (geocoded events are copied)
+    """
+
+    events_list, idx_list = events_and_idx
+    events_list = list(events_list)
+    for idx in idx_list:
+        event = events_list[idx]
+        coords = get_coords_by_address(event["attributes"]["location_name"])
+        if coords is not None:
+            attributes = dict(event["attributes"], lat=coords[0], lon=coords[1])
+            events_list[idx] = dict(event, attributes=attributes)
+
+    return events_list
+
+
+def route_events(events_list, tz_str, here_addr, app_id, app_code, ts_type="arrival"):
+    """
+    Pipeline step: requests trips between the consecutive events having location
+    Returns:
+        - (events_list, trips_list) as (tuple): events and trips between them
+    """
+
+    located_events = [
+        event for event in events_list
+        if event["attributes"]["lat"] is not None and event["attributes"]["lon"] is not None
+    ]
+    located_events.sort(key=lambda event: event["attributes"]["start_time"])
+
+    # The HERE client is imported on the first use, so the pipeline module (imported
+    # by every worker process) doesn't depend on it
+    from ..traffic_providers.here_route_request import get_trip_data
+
+    trips_list = [
+        get_trip_data(prev_event, next_event, tz_str, here_addr, app_id, app_code, ts_type=ts_type)
+        for prev_event, next_event in zip(located_events, located_events[1:])
+    ]
+
+    return events_list, trips_list
+
+
+def render_events_map(events_and_trips, zoom_start=15):
+    """
+    Pipeline step: renders map with the located events
+    Returns:
+        - result as (dict): "events", "trips" and "map_html" (rendered map) data
+    """
+
+    events_list, trips_list = events_and_trips
+    located_events = [
+        event for event in events_list
+        if event["attributes"]["lat"] is not None and event["attributes"]["lon"] is not None
+    ]
+
+    map_html = None
+    if located_events:
+        m = get_map_with_events(located_events, zoom_start=zoom_start)
+        with timer("folium_render"):
+            map_html = m.get_root().render()
+
+    return {"events": events_list, "trips": trips_list, "map_html": map_html}
+
+
+def build_events_pipeline(input_schema, tz_str, here_addr, app_id, app_code, ts_type="arrival",
+                          zoom_start=15, cpu_workers=2, io_workers=8, queue_size=16):
+    """
+    Returns pipeline validate -> address detection -> geocode -> route -> render
+    which input items are contexts with events (one per user/day) and outputs are
+    the 'render_events_map' results (or StageFailure for the failed contexts)
+    Parameters:
+        - input_schema as (dict): JSON schema of the contexts
+        - tz_str as (str): timezone as string
+        - here_addr as (str): url for the HERE request
+        - app_id as (str): application id
+        - app_code as (str): application code
+        - ts_type as (str): type of time used in the route request
+        - zoom_start as (int): map zoom initial level
+        - cpu_workers as (int): number of processes of every CPU-bound stage
+        - io_workers as (int): number of threads of every I/O-bound stage
+        - queue_size as (int): capacity of the stages' queues
+    Returns:
+        - pipeline as (Pipeline): the pipeline (call 'run(contexts)')
+    """
+
+    stages = [
+        Stage("validate", functools.partial(validate_context, input_schema=input_schema),
+              kind="cpu", workers=cpu_workers, queue_size=queue_size),
+        Stage("detect_addresses", detect_addresses,
+              kind="cpu", workers=cpu_workers, queue_size=queue_size),
+        Stage("geocode", geocode_addresses,
+              kind="io", workers=io_workers, queue_size=queue_size),
+        Stage("route", functools.partial(route_events, tz_str=tz_str, here_addr=here_addr,
+                                         app_id=app_id, app_code=app_code, ts_type=ts_type),
+              kind="io", workers=io_workers, queue_size=queue_size),
+        Stage("render", functools.partial(render_events_map, zoom_start=zoom_start),
+              kind="cpu", workers=cpu_workers, queue_size=queue_size),
+    ]
+
+    return Pipeline(stages)
@@ -0,0 +1,244 @@
+import os
+import sys
+import time
+import atexit
+import logging
+import threading
+import traceback
+
+from contextlib import ContextDecorator
+
+
+logger = logging.getLogger("infapi.plugins")
+
+
+class _FingerprintStats:
+
+    def __init__(self, fingerprint, message):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.count_since_flush = 0
+        self.first_seen = time.time()
+        self.last_seen = self.first_seen
+        self.last_message = message
+        self.samples = []
+        self.is_flushed = False
+
+
+class ExceptionTelemetry:
+    """
+    Aggregates exceptions by fingerprint (exception type + raise site) instead of
+    logging every traceback: keeps counters and up to 'max_samples' formatted
+    tracebacks per fingerprint and periodically logs a summary
+    Parameters:
+        - max_samples as (int): number of full tracebacks kept per fingerprint
+        - flush_interval as (float): seconds between the summaries (0 - flush on every record)
+        - log as (Logger): logger of the summaries
+    """
+
+    def __init__(self, max_samples=3, flush_interval=60.0, log=logger):
+        self.max_samples = max_samples
+        self.flush_interval = flush_interval
+        self.log = log
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._previous_hook = None
+
+    @staticmethod
+    def get_fingerprint(exc_type, tb):
+        """
+        Returns fingerprint of the exception: its type and the place it was raised at
+        (the innermost frame of the traceback)
+        """
+
+        site = "<unknown>"
+        if tb is not None:
+            while tb.tb_next is not None:
+                tb = tb.tb_next
+            code = tb.tb_frame.f_code
+            site = "%s:%d(%s)" % (os.path.basename(code.co_filename), tb.tb_lineno, code.co_name)
+
+        return "%s.%s@%s" % (exc_type.__module__, exc_type.__qualname__, site)
+
+    def record(self, exc_type, value, tb):
+        """
+        Counts the exception. The traceback is formatted only while the fingerprint
+        has less than 'max_samples' samples. The same exception object is counted once
+        even if it passes through several tracked entry points
+        """
+
+        if getattr(value, "_telemetry_recorded", False):
+            return
+        try:
+            value._telemetry_recorded = True
+        except AttributeError:
+            pass
+
+        fingerprint = self.get_fingerprint(exc_type, tb)
+        sample = None
+        with self._lock:
+            stats = self._get_stats(fingerprint, str(value))
+            take_sample = len(stats.samples) < self.max_samples
+        if take_sample:
+            sample = "".join(traceback.format_exception(exc_type, value, tb))
+        with self._lock:
+            if sample is not None and len(stats.samples) < self.max_samples:
+                stats.samples.append(sample)
+
+        self._maybe_flush(is_new=stats.count == 1)
+
+    def record_event(self, name, message=""):
+        """
+        Counts the failure which is not an exception (e.g. geocoder miss) under the given name
+        """
+
+        with self._lock:
+            stats = self._get_stats(name, message)
+
+        self._maybe_flush(is_new=stats.count == 1)
+
+    def _get_stats(self, fingerprint, message):
+        # Must be called with the lock acquired
+        stats = self._stats.get(fingerprint)
+        if stats is None:
+            stats = self._stats[fingerprint] = _FingerprintStats(fingerprint, message)
+        stats.count += 1
+        stats.count_since_flush += 1
+        stats.last_seen = time.time()
+        stats.last_message = message
+
+        return stats
+
+    def _maybe_flush(self, is_new=False):
+        # A new fingerprint is reported at once, the repeated ones - in the periodic summaries
+        if is_new or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Logs one summary line per fingerprint seen since the previous flush
+        (the first sample traceback is logged when the fingerprint is seen the first time)
+        """
+
+        with self._lock:
+            self._last_flush = time.monotonic()
+            flushed = []
+            for stats in self._stats.values():
+                if stats.count_since_flush:
+                    first_sample = None
+                    if not stats.is_flushed and stats.samples:
+                        first_sample = stats.samples[0]
+                    flushed.append((stats.fingerprint, stats.count_since_flush, stats.count,
+                                    stats.last_message, first_sample))
+                    stats.count_since_flush = 0
+                    stats.is_flushed = True
+
+        for fingerprint, count_since_flush, count, message, first_sample in flushed:
+            self.log.error("%s: %d occurrence(s) since last summary, %d total, last: %s",
+                           fingerprint, count_since_flush, count, message)
+            if first_sample is not None:
+                self.log.debug("First traceback of %s:\n%s", fingerprint, first_sample)
+
+    def get_summary(self):
+        """
+        Returns the aggregated data as list of dicts (most frequent first) with fingerprint,
+        count, first_seen, last_seen, last_message and samples keys
+        """
+
+        with self._lock:
+            summary = [{
+                "fingerprint": stats.fingerprint,
+                "count": stats.count,
+                "first_seen": stats.first_seen,
+                "last_seen": stats.last_seen,
+                "last_message": stats.last_message,
+                "samples": list(stats.samples),
+            } for stats in self._stats.values()]
+
+        return sorted(summary, key=lambda item: item["count"], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def install_excepthook(self):
+        """
+        Installs the hook recording unhandled exceptions. The previous hook is kept
+        and called after the recording, so the default traceback is still shown
+        """
+
+        if self._previous_hook is not None:
+            return
+        self._previous_hook = sys.excepthook
+
+        def on_crash(exc_type, value, tb):
+            self.record(exc_type, value, tb)
+            self.flush()
+            self._previous_hook(exc_type, value, tb)
+
+        sys.excepthook = on_crash
+
+    def uninstall_excepthook(self):
+        if self._previous_hook is not None:
+            sys.excepthook = self._previous_hook
+            self._previous_hook = None
+
+    def start_flush_thread(self):
+        """
+        Starts daemon thread flushing the summaries every 'flush_interval' seconds
+        (without it the summaries are flushed only when new exceptions are recorded)
+        """
+
+        if self.flush_interval <= 0:
+            raise ValueError("Flush interval must be positive to run the flush thread!")
+
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                self.flush()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+
+        return thread
+
+    def track(self, reraise=True):
+        """
+        Returns context manager/decorator recording the exceptions raised inside it
+        Parameters:
+            - reraise as (bool): whether to propagate the exceptions after the recording
+        """
+
+        return _ExceptionTracker(self, reraise)
+
+
+class _ExceptionTracker(ContextDecorator):
+
+    def __init__(self, telemetry, reraise):
+        self.telemetry = telemetry
+        self.reraise = reraise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, value, tb):
+        if exc_type is None or not issubclass(exc_type, Exception):
+            return False
+        self.telemetry.record(exc_type, value, tb)
+
+        return not self.reraise
+
+
+# Telemetry shared by the library entry points. The pending repeat counts are
+# flushed at exit, so the end of a batch job doesn't lose them
+telemetry = ExceptionTelemetry()
+atexit.register(telemetry.flush)
+
+
+def track_exceptions(reraise=True):
+    """
+    Context manager/decorator recording exceptions in the shared telemetry
+    """
+
+    return telemetry.track(reraise)
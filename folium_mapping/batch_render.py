@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+import logging
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .folium_maps import get_map_with_events, get_event_popup
+from ..performance_monitoring.metrics import inc_counter, timer
+
+
+logger = logging.getLogger("infapi.plugins")
+
+# Changing the version invalidates all cached maps (e.g. when the map layout changes)
+MAP_CACHE_VERSION = 1
+
+
+def get_events_map_hash(events_list, zoom_start=15):
+    """
+    Returns content hash of the map with the events. Only the data shown on the map
+    (markers' coordinates and popups, zoom level) is hashed, so the hash doesn't
+    change if other events' attributes are changed
+    Parameters:
+        - events_list as (list of dicts): events' list
+        - zoom_start as (int): map zoom initial level
+    Returns:
+        - map_hash as (str): hex digest of the map content
+    """
+
+    markers = []
+    for event in events_list:
+        attributes = event["attributes"]
+        markers.append((float(attributes["lat"]), float(attributes["lon"]), get_event_popup(event)))
+
+    content = json.dumps([MAP_CACHE_VERSION, zoom_start, markers], separators=(",", ":"))
+
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def render_events_map_to_file(events_list, file_path, zoom_start=15):
+    """
+    Renders the map with the events and writes it to the HTML-file. The file is
+    written under a temporary name and then renamed, so a partially written map
+    is never served from the cache
+    Parameters:
+        - events_list as (list of dicts): events' list
+        - file_path as (str): path to the output HTML-file
+        - zoom_start as (int): map zoom initial level
+    Returns:
+        - file_path as (str): path to the written file
+    """
+
+    tmp_path = "%s.%d.tmp" % (file_path, os.getpid())
+    try:
+        m = get_map_with_events(events_list, zoom_start=zoom_start)
+        with timer("folium_render"), open(tmp_path, "wb") as f:
+            m.get_root().save(f, close_file=False)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return file_path
+
+
+def render_maps_batch(maps_events, output_dir, zoom_start=15, max_workers=None):
+    """
+    Renders maps with events in parallel (process pool) and writes them to the output
+    directory as '<content hash>.html'. Maps which file already exists are not re-rendered
+    Parameters:
+        - maps_events as (dict): events' lists by the map key, e.g. {(user_id, day): events_list}
+        - output_dir as (str): directory of the rendered maps (the cache)
+        - zoom_start as (int): map zoom initial level
+        - max_workers as (int): number of the rendering processes (CPUs count by default)
+    Returns:
+        - maps_files as (dict): paths to the HTML-files of the ready maps by the map key
+        - failed_maps as (dict): exceptions raised while rendering by the map key
+          (a failed map doesn't stop the rendering of the others)
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    maps_files = {}
+    failed_maps = {}
+    to_render = {}
+    keys_by_file = {}
+    for map_key, events_list in maps_events.items():
+        try:
+            file_path = os.path.join(output_dir, get_events_map_hash(events_list, zoom_start) + ".html")
+        except (KeyError, TypeError, ValueError) as e:
+            failed_maps[map_key] = e
+            continue
+        maps_files[map_key] = file_path
+        if os.path.exists(file_path):
+            inc_counter("map_cache_hits_total")
+        else:
+            to_render.setdefault(file_path, events_list)
+            keys_by_file.setdefault(file_path, []).append(map_key)
+
+    if not to_render:
+        return maps_files, failed_maps
+
+    failed_renders = 0
+    with ProcessPoolExecutor(max_workers) as executor:
+        futures = {
+            executor.submit(render_events_map_to_file, events_list, file_path, zoom_start): file_path
+            for file_path, events_list in to_render.items()
+        }
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                future.result()
+                inc_counter("map_cache_misses_total")
+            except Exception as e:
+                logger.warning("Failed to render map %s: %s", file_path, e)
+                failed_renders += 1
+                for map_key in keys_by_file[file_path]:
+                    del maps_files[map_key]
+                    failed_maps[map_key] = e
+
+    logger.debug("Rendered %d of %d maps, %d failed", len(to_render) - failed_renders,
+                 len(maps_events), len(failed_maps))
+
+    return maps_files, failed_maps
@@ -1,6 +1,9 @@
-import numpy as np
-import folium
+from ..performance_monitoring.metrics import timed
+from ..performance_monitoring.profiling import profile_function
+from ..exceptions_handling.exception_telemetry import track_exceptions
 
+
+@timed("get_map_with_markers")
 def get_map_with_markers(markers_coords_list, zoom_start=15):
     """
     Returns folium map object with points with coordinates from 'markers_coords_list'.
@@ -12,6 +15,9 @@ def get_map_with_markers(markers_coords_list, zoom_start=15):
         - m as (map object): map with markers
     """
     
+    import numpy as np
+    import folium
+    
     center_point = np.mean(np.array(markers_coords_list), axis=0)
     m = folium.Map(location=center_point, zoom_start=zoom_start)
     
@@ -22,6 +28,9 @@ def get_map_with_markers(markers_coords_list, zoom_start=15):
     return m
 	
 	
+@track_exceptions()
+@profile_function("get_map_with_events")
+@timed("get_map_with_events")
 def get_map_with_events(events_list, zoom_start=15):
     """
     Returns folium map object with points with coordinates from 'markers_coords_list'.
@@ -35,6 +44,9 @@ def get_map_with_events(events_list, zoom_start=15):
     
     markers_coords_list = get_places_coords_list(events_list)
     
+    import numpy as np
+    import folium
+    
     center_point = np.mean(np.array(markers_coords_list), axis=0)
     m = folium.Map(location=center_point, zoom_start=zoom_start)
     
@@ -42,7 +54,7 @@ def get_map_with_events(events_list, zoom_start=15):
         cur_coords = (float(event['attributes']['lat']), 
                       float(event['attributes']['lon'])
                      )
-        cur_idx = event['attributes']['place_id']
+        cur_idx = get_event_popup(event)
         folium.Marker(
             cur_coords,
             popup=cur_idx
@@ -68,3 +80,18 @@ def get_places_coords_list(events_list):
         places_coords_list.append((cur_lat, cur_lon))
         
     return places_coords_list
+
+
+def get_event_popup(event):
+    """
+    Returns popup text of the event marker: 'place_id' of the event or its 'id'
+    for the events in the input schema format (they have no 'place_id')
+    Parameters:
+        - event as (dict): event data
+    Returns:
+        - popup as (str): marker popup text
+    """
+    
+    attributes = event['attributes']
+    
+    return attributes['place_id'] if 'place_id' in attributes else attributes['id']
@@ -1,14 +1,32 @@
-import geocoder
-import nltk 
+import math
 import logging
-import numpy as np
+import functools
 
-from nltk.corpus import brown
+from ..performance_monitoring.metrics import timed, timer, inc_counter
+from ..performance_monitoring.profiling import profile_function
+from ..exceptions_handling.exception_telemetry import telemetry, track_exceptions
 
 
 logger = logging.getLogger("infapi.plugins")
 
+# Heavy dependencies (nltk, geocoder) and NLTK models are imported/loaded on
+# the first use, so importing this module (e.g. only for 'simple_dist') is cheap
 
+
+@functools.lru_cache(maxsize=None)
+def _get_pos_tagger():
+    """
+    Returns NLTK perceptron POS-tagger (the model is loaded once per process)
+    """
+    
+    from nltk.tag.perceptron import PerceptronTagger
+    
+    return PerceptronTagger()
+
+
+@track_exceptions()
+@profile_function("is_string_address")
+@timed("is_string_address")
 def is_string_address(input_str):
     """
     Checking whether the input string is address or not
@@ -18,7 +36,10 @@ def is_string_address(input_str):
         - boolean depending on the checking (True if address and False if not)
     """
     
-    for chunk in nltk.ne_chunk(nltk.pos_tag(nltk.word_tokenize(input_str))):
+    import nltk
+    
+    tagged_tokens = _get_pos_tagger().tag(nltk.word_tokenize(input_str))
+    for chunk in nltk.ne_chunk(tagged_tokens):
         if hasattr(chunk, "label"):
             if chunk.label() == "GPE" or chunk.label() == "GSP":
                 return True
@@ -26,6 +47,9 @@ def is_string_address(input_str):
     return False
 
 
+@track_exceptions()
+@profile_function("get_coords_by_address")
+@timed("get_coords_by_address")
 def get_coords_by_address(addr_str):
     """
     Returns coordinates (lat/lon) of the point with a given address (OSM geocoder is used)
@@ -36,11 +60,15 @@ def get_coords_by_address(addr_str):
         - None if the address wasn't recognized
     """
     
-    gcd = geocoder.osm(addr_str)
+    import geocoder
+    
+    with timer("osm_geocoder_request"):
+        gcd = geocoder.osm(addr_str)
     location = gcd.latlng
     
     if location is None:
-        logger.error('Address was not recognized...')
+        inc_counter("geocoder_misses_total")
+        telemetry.record_event("geocoder_miss", 'Address was not recognized: %s' % addr_str)
         return None
     else:
         coords = tuple(location)
@@ -57,9 +85,31 @@ def simple_dist(point1, point2):
         - dist as (float): distance in kilometers between the points    
     """
     
-    dx = (40074.275 * (np.abs(point2[1] - point1[1]) / 360) 
-          * np.cos(np.deg2rad(np.mean([point1[0], point2[0]]))))
-    dy = 20004.146 * (np.abs(point1[0] - point2[0])) / 180
+    dx = (40074.275 * (abs(point2[1] - point1[1]) / 360) 
+          * math.cos(math.radians((point1[0] + point2[0]) / 2)))
+    dy = 20004.146 * (abs(point1[0] - point2[0])) / 180
+    dist = math.sqrt(dx * dx + dy * dy)
+    
+    return dist
+
+
+def simple_dist_array(points1, points2):
+    """
+    Vectorized version of 'simple_dist' for arrays of points (e.g. coordinates from the event store)
+    Parameters:
+        - points1, points2 as (array-like of shape (N, 2)): lat/lon coordinates of the points
+    Returns:
+        - dist as (numpy array): distances in kilometers between the corresponding points
+    """
+    
+    import numpy as np
+    
+    points1 = np.asarray(points1, dtype=float)
+    points2 = np.asarray(points2, dtype=float)
+    
+    dx = (40074.275 * (np.abs(points2[:, 1] - points1[:, 1]) / 360) 
+          * np.cos(np.deg2rad((points1[:, 0] + points2[:, 0]) / 2)))
+    dy = 20004.146 * (np.abs(points1[:, 0] - points2[:, 0])) / 180
     dist = np.sqrt(np.square(dx) + np.square(dy))
     
     return dist
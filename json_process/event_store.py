@@ -0,0 +1,371 @@
+from .json_validation import validate_my_json, JsonValidationError
+from .typed_events import ATTRIBUTES_RULES, check_value
+
+# Columns of the event store: (name, arrow type name, nullable).
+# 'user_id', 'device_id' and 'type' come from the event itself, the rest from its 'attributes'
+EVENT_COLUMNS = (
+    ("user_id", "string", False),
+    ("device_id", "string", False),
+    ("type", "category", False),
+    ("id", "string", True),
+    ("title", "string", False),
+    ("lat", "float64", True),
+    ("lon", "float64", True),
+    ("location_name", "string", False),
+    ("communication_info", "string", True),
+    ("start_time", "int64", False),
+    ("timezone", "int64", False),
+    ("duration_minutes", "float64", True),
+    ("attendee_status", "string", True),
+    ("is_organiser", "bool", True),
+    ("valid", "bool", False),
+)
+
+EVENT_FIELDS = ("user_id", "device_id", "type")
+
+ATTRIBUTE_FIELDS = tuple(name for name, _, _ in EVENT_COLUMNS if name not in EVENT_FIELDS)
+
+_EVENT_VIEW_KEYS = ("attributes",) + EVENT_FIELDS
+
+
+class EventStoreError(Exception):
+    pass
+
+
+def get_events_arrow_schema():
+    """
+    Returns Arrow schema of the event store (pyarrow is imported on the first use)
+    Returns:
+        - schema as (pyarrow.Schema): schema of the events table
+    """
+
+    import pyarrow as pa
+
+    arrow_types = {
+        "string": pa.string(),
+        "category": pa.dictionary(pa.int8(), pa.string()),
+        "float64": pa.float64(),
+        "int64": pa.int64(),
+        "bool": pa.bool_(),
+    }
+
+    return pa.schema([
+        pa.field(name, arrow_types[type_name], nullable=nullable)
+        for name, type_name, nullable in EVENT_COLUMNS
+    ])
+
+
+class _AttributesView:
+    """
+    Read-only view of the row attributes (supports 'view["lat"]', 'in' and 'dict(view)'
+    like the attributes dict)
+    """
+
+    __slots__ = ("_store", "_idx")
+
+    def __init__(self, store, idx):
+        self._store = store
+        self._idx = idx
+
+    def __getitem__(self, key):
+        if key not in ATTRIBUTE_FIELDS:
+            raise KeyError(key)
+        return self._store.column_values(key)[self._idx]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return ATTRIBUTE_FIELDS
+
+    def __iter__(self):
+        return iter(ATTRIBUTE_FIELDS)
+
+    def __len__(self):
+        return len(ATTRIBUTE_FIELDS)
+
+    def __contains__(self, key):
+        return key in ATTRIBUTE_FIELDS
+
+
+class EventView:
+    """
+    Read-only view of the store row with the same access pattern as the event dict
+    ('event["attributes"]["lat"]', 'event["user_id"]'), so the routing and mapping
+    helpers can consume the store without building dicts
+    """
+
+    __slots__ = ("_store", "_idx")
+
+    def __init__(self, store, idx):
+        self._store = store
+        self._idx = idx
+
+    def __getitem__(self, key):
+        if key == "attributes":
+            return _AttributesView(self._store, self._idx)
+        if key not in EVENT_FIELDS:
+            raise KeyError(key)
+        return self._store.column_values(key)[self._idx]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return _EVENT_VIEW_KEYS
+
+    def __iter__(self):
+        return iter(_EVENT_VIEW_KEYS)
+
+    def __len__(self):
+        return len(_EVENT_VIEW_KEYS)
+
+    def __contains__(self, key):
+        return key in _EVENT_VIEW_KEYS
+
+
+class EventStore:
+    """
+    Columnar (Apache Arrow) storage of the events in the 'json_process' events format.
+    The schema is enforced when the store is built, the data can be persisted
+    as Parquet or Arrow IPC file and read back memory-mapped.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self._values_cache = {}
+
+    def __len__(self):
+        return self.table.num_rows
+
+    @classmethod
+    def from_events(cls, events_list, input_schema=None):
+        """
+        Builds the store from the list of events
+        Parameters:
+            - events_list as (list of dicts): events' list
+            - input_schema as (dict): JSON schema to validate the events with (optional;
+                                      the events' type, null and range rules are checked anyway)
+        Returns:
+            - store as (EventStore): store with the events
+        """
+
+        if input_schema is not None:
+            validate_my_json({"events": events_list}, input_schema)
+
+        columns = {name: [] for name, _, _ in EVENT_COLUMNS}
+        for idx, event in enumerate(events_list):
+            try:
+                attributes = event["attributes"]
+                row = [event[name] for name in EVENT_FIELDS]
+                row += [attributes[name] for name in ATTRIBUTE_FIELDS]
+            except (KeyError, TypeError) as e:
+                raise EventStoreError("Events schema error: events[%d] misses %s" % (idx, e))
+            for name, value in zip(EVENT_FIELDS + ATTRIBUTE_FIELDS, row):
+                columns[name].append(value)
+
+        return cls(cls._build_table(columns))
+
+    @staticmethod
+    def _check_events_rules(columns):
+        """
+        Checks the per-type rules of the events schema (types enum, nulls and ranges),
+        which the Arrow typing alone doesn't enforce
+        """
+
+        for idx, event_type in enumerate(columns["type"]):
+            rules = ATTRIBUTES_RULES.get(event_type) if isinstance(event_type, str) else None
+            if rules is None:
+                raise EventStoreError("Events schema error: events[%d] has unknown type: %r"
+                                      % (idx, event_type))
+            for name, (allowed_types, value_range) in rules.items():
+                try:
+                    columns[name][idx] = check_value(columns[name][idx], allowed_types, value_range,
+                                                     "events[%d].attributes.%s" % (idx, name))
+                except JsonValidationError as e:
+                    raise EventStoreError(str(e).replace("JSON validation error", "Events schema error"))
+
+    @classmethod
+    def _build_table(cls, columns):
+        cls._check_events_rules(columns)
+
+        import pyarrow as pa
+
+        schema = get_events_arrow_schema()
+        try:
+            table = pa.Table.from_pydict(columns, schema=schema)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise EventStoreError('Events schema error: %s' % e)
+
+        for field in schema:
+            if not field.nullable and table.column(field.name).null_count:
+                raise EventStoreError("Events schema error: '%s' can't be null" % field.name)
+
+        return table
+
+    def write(self, file_path, file_format=None):
+        """
+        Persists the store to the file
+        Parameters:
+            - file_path as (str): path to the output file
+            - file_format as (str): "parquet" or "arrow" (IPC); by default it is
+                                    defined by the file extension ('.parquet' or other)
+        """
+
+        file_format = file_format or _get_file_format(file_path)
+
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+            pq.write_table(self.table, file_path)
+        else:
+            import pyarrow as pa
+            with pa.OSFile(file_path, "wb") as sink:
+                with pa.ipc.new_file(sink, self.table.schema) as writer:
+                    writer.write_table(self.table)
+
+    @classmethod
+    def open(cls, file_path, file_format=None):
+        """
+        Reads the store from the file using memory mapping (Arrow IPC files are
+        read zero-copy, Parquet files are decoded from the mapped file)
+        Parameters:
+            - file_path as (str): path to the store file
+            - file_format as (str): "parquet" or "arrow" (IPC); by default it is
+                                    defined by the file extension ('.parquet' or other)
+        Returns:
+            - store as (EventStore): store with the events
+        """
+
+        import pyarrow as pa
+
+        file_format = file_format or _get_file_format(file_path)
+
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+            table = pq.read_table(file_path, memory_map=True)
+        else:
+            table = pa.ipc.open_file(pa.memory_map(file_path, "r")).read_all()
+
+        schema = get_events_arrow_schema()
+        if not table.schema.equals(schema):
+            try:
+                table = table.cast(schema)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, ValueError):
+                raise EventStoreError("File '%s' doesn't match the events schema" % file_path)
+
+        return cls(table)
+
+    def filter_user(self, user_id):
+        """
+        Returns the store with events of the given user only
+        """
+
+        import pyarrow.compute as pc
+
+        return EventStore(self.table.filter(pc.equal(self.table.column("user_id"), user_id)))
+
+    def filter_time_range(self, start_ms=None, end_ms=None):
+        """
+        Returns the store with events started in the [start_ms, end_ms) range
+        Parameters:
+            - start_ms as (int): UTC-timestamp of the range start in milliseconds (optional)
+            - end_ms as (int): UTC-timestamp of the range end in milliseconds (optional)
+        """
+
+        import pyarrow.compute as pc
+
+        start_time = self.table.column("start_time")
+        mask = None
+        if start_ms is not None:
+            mask = pc.greater_equal(start_time, start_ms)
+        if end_ms is not None:
+            end_mask = pc.less(start_time, end_ms)
+            mask = end_mask if mask is None else pc.and_(mask, end_mask)
+
+        if mask is None:
+            return self
+
+        return EventStore(self.table.filter(mask))
+
+    def with_coords(self):
+        """
+        Returns the store with events having location (not null lat/lon) only
+        """
+
+        import pyarrow.compute as pc
+
+        mask = pc.and_(pc.is_valid(self.table.column("lat")), pc.is_valid(self.table.column("lon")))
+
+        return EventStore(self.table.filter(mask))
+
+    def sort_by_time(self):
+        """
+        Returns the store sorted by user and events' start time
+        """
+
+        return EventStore(self.table.sort_by([("user_id", "ascending"), ("start_time", "ascending")]))
+
+    def get_users(self):
+        """
+        Returns list of the users' ids in the store
+        """
+
+        import pyarrow.compute as pc
+
+        return pc.unique(self.table.column("user_id")).to_pylist()
+
+    def get_coords(self):
+        """
+        Returns events' coordinates as numpy array of (lat, lon) rows (NaN for missing
+        location), which can be passed to 'get_map_with_markers' and 'simple_dist_array'
+        """
+
+        import numpy as np
+
+        lat = self.table.column("lat").to_numpy()
+        lon = self.table.column("lon").to_numpy()
+
+        return np.column_stack((lat, lon))
+
+    def column_values(self, name):
+        """
+        Returns the column values as python list (converted once per store)
+        """
+
+        values = self._values_cache.get(name)
+        if values is None:
+            values = self._values_cache[name] = self.table.column(name).to_pylist()
+
+        return values
+
+    def iter_events(self):
+        """
+        Yields views of the events (the same access pattern as the event dicts)
+        """
+
+        for idx in range(len(self)):
+            yield EventView(self, idx)
+
+    def iter_consecutive_events(self):
+        """
+        Yields pairs of consecutive events of every user (ordered by start time),
+        e.g. to be passed to 'get_trip_data' as (prev_event, next_event)
+        """
+
+        store = self.sort_by_time()
+        user_ids = store.column_values("user_id")
+        for idx in range(1, len(store)):
+            if user_ids[idx] == user_ids[idx - 1]:
+                yield EventView(store, idx - 1), EventView(store, idx)
+
+
+def _get_file_format(file_path):
+    if file_path.lower().endswith((".parquet", ".pq")):
+        return "parquet"
+    return "arrow"
@@ -0,0 +1,64 @@
+from ..performance_monitoring.metrics import timed
+from ..performance_monitoring.profiling import profile_function
+from ..exceptions_handling.exception_telemetry import track_exceptions
+
+
+class JsonValidationError(Exception):
+    pass
+
+
+def _get_plain_json(data):
+    """
+    Returns the data with the dict-like objects (e.g. typed events) replaced by dicts,
+    as jsonschema treats only dicts as JSON objects
+    """
+
+    if isinstance(data, dict):
+        return {key: _get_plain_json(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_get_plain_json(value) for value in data]
+    if hasattr(data, "keys") and hasattr(data, "__getitem__"):
+        return {key: _get_plain_json(data[key]) for key in data.keys()}
+
+    return data
+
+
+@timed("validate_my_json")
+def validate_my_json(js_data, input_schema):
+    """
+    Validate input json string by checking correctness of JSON format and
+    correspondence of the input to the given json schema. Raises the exceptions
+    in case of errors
+    Parameters:
+        - js_data as (dict): input data to validate (may contain typed events)
+        - input_schema as (dict): JSON schema to be used as templete
+    Returns:
+        - js_data as (dict): parsed input data
+    """
+
+    import jsonschema
+
+    try:
+        jsonschema.validate(_get_plain_json(js_data), input_schema)
+    except jsonschema.exceptions.ValidationError as e:
+        raise JsonValidationError('JSON validation error: %s' % e.message)
+
+    return js_data
+
+
+@track_exceptions()
+@profile_function("get_input_events_list")
+@timed("get_input_events_list")
+def get_input_events_list(context, input_schema):
+    """
+    Returned list of events/places extracted from the input json_string
+    Parameters:
+        - context as (dict): input context with events
+    Returns:
+        - list of events/places from the context or raises the exception
+    """
+
+    # Validation errors are aggregated by the exceptions telemetry instead of being logged on every call
+    data = validate_my_json(context, input_schema)
+
+    return data['events']
@@ -0,0 +1,303 @@
+import functools
+
+from .json_validation import JsonValidationError
+
+
+# Type rules of the events' attributes by the event type (the same as in the input
+# JSON schema): field name -> (allowed types, (minimum, maximum) or None)
+_STR = (str,)
+_NUM = (int, float)
+_INT = (int,)
+_BOOL = (bool,)
+_NULL = (type(None),)
+
+_LAT_RANGE = (-90, 90)
+_LON_RANGE = (-180, 180)
+_START_TIME_RANGE = (1262304000000, 1893456000000)
+_TIMEZONE_RANGE = (-86400000, 86400000)
+_DURATION_RANGE = (0, None)
+
+ATTRIBUTES_RULES = {
+    "CalendarEvent": {
+        "id": (_STR, None),
+        "title": (_STR, None),
+        "lat": (_NUM + _NULL, _LAT_RANGE),
+        "lon": (_NUM + _NULL, _LON_RANGE),
+        "location_name": (_STR, None),
+        "communication_info": (_STR, None),
+        "start_time": (_INT, _START_TIME_RANGE),
+        "timezone": (_INT, _TIMEZONE_RANGE),
+        "duration_minutes": (_NUM, _DURATION_RANGE),
+        "attendee_status": (_STR, None),
+        "is_organiser": (_BOOL, None),
+        "valid": (_BOOL, None),
+    },
+    "DayPlanPlace": {
+        "id": (_STR, None),
+        "title": (_STR, None),
+        "lat": (_NUM, _LAT_RANGE),
+        "lon": (_NUM, _LON_RANGE),
+        "location_name": (_STR, None),
+        "communication_info": (_NULL, None),
+        "start_time": (_INT, _START_TIME_RANGE),
+        "timezone": (_INT, _TIMEZONE_RANGE),
+        "duration_minutes": (_NUM, _DURATION_RANGE),
+        "attendee_status": (_NULL, None),
+        "is_organiser": (_NULL, None),
+        "valid": (_BOOL, None),
+    },
+    "CurrentLocation": {
+        "id": (_NULL, None),
+        "title": (_STR, None),
+        "lat": (_NUM, _LAT_RANGE),
+        "lon": (_NUM, _LON_RANGE),
+        "location_name": (_STR, None),
+        "communication_info": (_NULL, None),
+        "start_time": (_INT, _START_TIME_RANGE),
+        "timezone": (_INT, _TIMEZONE_RANGE),
+        "duration_minutes": (_NULL, None),
+        "attendee_status": (_NULL, None),
+        "is_organiser": (_NULL, None),
+        "valid": (_BOOL, None),
+    },
+}
+
+
+class _SlotsMapping:
+    """
+    Base of the typed objects: read-only dict-like access to the fields
+    ('obj["lat"]', 'obj.get("lat")', 'dict(obj)'), so the library functions
+    written for plain dicts accept the typed objects as well
+    """
+
+    __slots__ = ()
+
+    # Names of the fields stored in the slots
+    _fields = ()
+
+    def _get_extra(self):
+        # Fields beyond the declared ones (by name)
+        return _NO_EXTRA
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        return self._get_extra()[key]
+
+    def get(self, key, default=None):
+        if key in self._fields:
+            return getattr(self, key)
+        return self._get_extra().get(key, default)
+
+    def keys(self):
+        extra = self._get_extra()
+        return self._fields + tuple(extra) if extra else self._fields
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self._fields) + len(self._get_extra())
+
+    def __contains__(self, key):
+        return key in self._fields or key in self._get_extra()
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return (all(getattr(self, key) == getattr(other, key) for key in self._fields)
+                and self._get_extra() == other._get_extra())
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__,
+                           ", ".join("%s=%r" % (key, self[key]) for key in self.keys()))
+
+
+_NO_EXTRA = {}
+
+
+class Attributes(_SlotsMapping):
+    """
+    Attributes of the event. The attributes not listed in the type rules
+    (e.g. 'place_id') are kept in 'extra' and accessed like the others
+    """
+
+    _fields = ("id", "title", "lat", "lon", "location_name", "communication_info",
+               "start_time", "timezone", "duration_minutes", "attendee_status",
+               "is_organiser", "valid")
+    __slots__ = _fields + ("extra",)
+
+    def __init__(self, id, title, lat, lon, location_name, communication_info, start_time,
+                 timezone, duration_minutes, attendee_status, is_organiser, valid, extra=None):
+        self.id = id
+        self.title = title
+        self.lat = lat
+        self.lon = lon
+        self.location_name = location_name
+        self.communication_info = communication_info
+        self.start_time = start_time
+        self.timezone = timezone
+        self.duration_minutes = duration_minutes
+        self.attendee_status = attendee_status
+        self.is_organiser = is_organiser
+        self.valid = valid
+        self.extra = extra or _NO_EXTRA
+
+    def _get_extra(self):
+        return self.extra
+
+
+class Event(_SlotsMapping):
+    _fields = ("attributes", "type", "user_id", "device_id")
+    __slots__ = _fields
+
+    def __init__(self, attributes, type, user_id, device_id):
+        self.attributes = attributes
+        self.type = type
+        self.user_id = user_id
+        self.device_id = device_id
+
+
+class RouteSummary(_SlotsMapping):
+    _fields = ("distance", "travelTime")
+    __slots__ = _fields
+
+    def __init__(self, distance, travelTime):
+        self.distance = distance
+        self.travelTime = travelTime
+
+
+@functools.lru_cache(maxsize=None)
+def _get_json_loads():
+    """
+    Returns the fastest available JSON decoder (orjson if installed, stdlib json otherwise)
+    """
+
+    try:
+        import orjson
+        return orjson.loads
+    except ImportError:
+        import json
+        return json.loads
+
+
+def loads_json(data):
+    """
+    Decodes JSON document with the fastest available decoder
+    Parameters:
+        - data as (bytes or str): JSON document
+    Returns:
+        - decoded data (dicts, lists, etc.)
+    """
+
+    return _get_json_loads()(data)
+
+
+def check_value(value, allowed_types, value_range, path):
+    """
+    Checks the value against the schema type rule, raises JsonValidationError if it is violated
+    Parameters:
+        - value: the value to be checked
+        - allowed_types as (tuple of types): allowed python types
+        - value_range as (tuple): (minimum, maximum) or None; None bound is not checked
+        - path as (str): location of the value used in the error messages
+    Returns:
+        - value: the checked value (a float without fractional part is converted to int
+                 where an integer is required, as the JSON schema "integer" accepts it)
+    """
+
+    if type(value) is float and int in allowed_types and float not in allowed_types and value.is_integer():
+        value = int(value)
+
+    # bool is a subclass of int, but the JSON schema doesn't treat booleans as numbers
+    if isinstance(value, bool) and bool not in allowed_types or not isinstance(value, allowed_types):
+        raise JsonValidationError('JSON validation error: %s has wrong type: %r' % (path, value))
+
+    if value_range is not None and value is not None:
+        minimum, maximum = value_range
+        if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+            raise JsonValidationError('JSON validation error: %s is out of range: %r' % (path, value))
+
+    return value
+
+
+def decode_event(event_data, path="event"):
+    """
+    Converts the event dict to the typed Event object checking the schema rules
+    Parameters:
+        - event_data as (dict): decoded event
+        - path as (str): location of the event used in the error messages
+    Returns:
+        - event as (Event): the typed event
+    """
+
+    if not isinstance(event_data, dict):
+        raise JsonValidationError('JSON validation error: %s is not an object' % path)
+
+    try:
+        event_type = event_data["type"]
+        user_id = event_data["user_id"]
+        device_id = event_data["device_id"]
+        attributes_data = event_data["attributes"]
+    except KeyError as e:
+        raise JsonValidationError('JSON validation error: %s misses %s' % (path, e))
+
+    rules = ATTRIBUTES_RULES.get(event_type) if isinstance(event_type, str) else None
+    if rules is None:
+        raise JsonValidationError('JSON validation error: %s has unknown type: %r' % (path, event_type))
+    check_value(user_id, _STR, None, path + ".user_id")
+    check_value(device_id, _STR, None, path + ".device_id")
+
+    if not isinstance(attributes_data, dict):
+        raise JsonValidationError('JSON validation error: %s.attributes is not an object' % path)
+
+    values = {}
+    for name, (allowed_types, value_range) in rules.items():
+        try:
+            value = attributes_data[name]
+        except KeyError:
+            raise JsonValidationError('JSON validation error: %s.attributes misses %r' % (path, name))
+        values[name] = check_value(value, allowed_types, value_range, "%s.attributes.%s" % (path, name))
+
+    # The schema allows additional attributes (e.g. 'place_id' shown in the map popups)
+    extra = None
+    if len(attributes_data) > len(rules):
+        extra = {name: value for name, value in attributes_data.items() if name not in rules}
+
+    return Event(Attributes(extra=extra, **values), event_type, user_id, device_id)
+
+
+def decode_events(data):
+    """
+    Decodes the input context (JSON document with "events" list) straight to the typed
+    events. Fast alternative of 'get_input_events_list' for the trusted producers
+    Parameters:
+        - data as (bytes or str): JSON document of the context
+    Returns:
+        - events_list as (list of Event): typed events
+    """
+
+    try:
+        context = loads_json(data)
+    except ValueError as e:
+        raise JsonValidationError('JSON validation error: %s' % e)
+
+    if not isinstance(context, dict) or not isinstance(context.get("events"), list):
+        raise JsonValidationError("JSON validation error: 'events' list is required")
+
+    return [decode_event(event_data, "events[%d]" % idx)
+            for idx, event_data in enumerate(context["events"])]
+
+
+def get_route_summary(here_resp):
+    """
+    Returns summary of the first route of the decoded HERE response
+    Parameters:
+        - here_resp as (dict): decoded HERE response
+    Returns:
+        - summary as (RouteSummary): route distance (meters) and travel time (seconds)
+    """
+
+    summary = here_resp["response"]["route"][0]["summary"]
+
+    return RouteSummary(summary["distance"], summary["travelTime"])
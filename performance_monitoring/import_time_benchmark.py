@@ -0,0 +1,151 @@
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+
+# Library modules and heavy dependencies which must not be loaded by importing them
+GUARDED_MODULES = {
+    "geodata_process.geocode_place": ("nltk", "geocoder", "numpy"),
+    "folium_mapping.folium_maps": ("folium", "jinja2", "numpy"),
+    "traffic_providers.here_route_request": ("requests", "pytz"),
+    "json_process.json_validation": ("jsonschema",),
+    "json_process.event_store": ("pyarrow", "numpy", "jsonschema"),
+    "json_process.typed_events": ("orjson", "jsonschema"),
+}
+
+# Library modules which may be absent from the checkout (e.g. the shared exceptions
+# module of the service). The probe replaces a missing one with a stub, so the modules
+# importing it are still measured
+STUB_MODULES = ("exceptions",)
+
+# Default budget of the cumulative import time of a guarded module (microseconds)
+DEFAULT_BUDGET_US = 50000
+
+# Runs in the probe interpreter before the import: registers the stubs of the missing
+# modules, any public name of a stub is an exception class
+_STUB_SNIPPET = """
+import sys, types, importlib.util
+def _stub_getattr(name):
+    if name.startswith("_"):
+        raise AttributeError(name)
+    return type(name, (Exception,), {})
+for _name in %r:
+    if importlib.util.find_spec(_name) is None:
+        sys.modules[_name] = types.ModuleType(_name)
+        sys.modules[_name].__getattr__ = _stub_getattr
+"""
+
+
+def get_import_times(module_name, cwd=None, python=sys.executable, stub_modules=()):
+    """
+    Imports the module in a fresh interpreter with '-X importtime'
+    Parameters:
+        - module_name as (str): full name of the module to be imported
+        - cwd as (str): working directory of the interpreter
+        - python as (str): path to the python interpreter
+        - stub_modules as (tuple of str): full names of the modules replaced by stubs if missing
+    Returns:
+        - import_times as (dict): cumulative import time (microseconds) of every
+                                  module loaded by the import, by module name
+    """
+
+    code = "import " + module_name
+    if stub_modules:
+        code = _STUB_SNIPPET % (tuple(stub_modules),) + code
+
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", code],
+        cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+    )
+    if proc.returncode != 0:
+        last_line = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else ""
+        # Keep the name of the missing module (if any) to tell eager heavy imports from other failures
+        missing = re.search(r"No module named '([^']+)'", last_line)
+        raise ImportError("Failed to import '%s': %s" % (module_name, last_line),
+                          name=missing.group(1) if missing else None)
+
+    import_times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            # header line
+            continue
+        import_times[fields[2].strip()] = int(fields[1])
+
+    return import_times
+
+
+def check_import_time(module_name, heavy_modules, budget_us=DEFAULT_BUDGET_US, cwd=None, stub_modules=()):
+    """
+    Checks that importing the module doesn't load heavy dependencies and fits the time budget
+    Parameters:
+        - module_name as (str): full name of the module to be checked
+        - heavy_modules as (tuple of str): top-level names of the modules that must stay unloaded
+        - budget_us as (int): allowed cumulative import time in microseconds
+        - cwd as (str): working directory of the interpreter
+        - stub_modules as (tuple of str): full names of the modules replaced by stubs if missing
+    Returns:
+        - errors as (list of str): found violations (empty if the check passed)
+        - cumulative_us as (int): cumulative import time of the module
+    """
+
+    import_times = get_import_times(module_name, cwd=cwd, stub_modules=stub_modules)
+    errors = []
+
+    loaded_heavy = sorted(
+        name for name in import_times if name.split(".")[0] in heavy_modules
+    )
+    if loaded_heavy:
+        errors.append("%s eagerly imports: %s" % (module_name, ", ".join(loaded_heavy)))
+
+    cumulative_us = import_times.get(module_name, 0)
+    if cumulative_us > budget_us:
+        errors.append("%s import took %d us (budget is %d us)" % (module_name, cumulative_us, budget_us))
+
+    return errors, cumulative_us
+
+
+def main(argv=None):
+    """
+    Runs the import-time checks of the library modules. Returns non-zero exit code
+    if any of them fails, so the script can be used as a CI guard:
+        python -m <package>.performance_monitoring.import_time_benchmark
+    """
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--budget-us", type=int, default=DEFAULT_BUDGET_US,
+                        help="allowed cumulative import time of every module (microseconds)")
+    args = parser.parse_args(argv)
+
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    package_name = os.path.basename(package_dir)
+
+    stub_modules = tuple("%s.%s" % (package_name, name) for name in STUB_MODULES)
+
+    failed = False
+    for module_name, heavy_modules in sorted(GUARDED_MODULES.items()):
+        full_name = "%s.%s" % (package_name, module_name)
+        try:
+            errors, cumulative_us = check_import_time(
+                full_name, heavy_modules, budget_us=args.budget_us,
+                cwd=os.path.dirname(package_dir), stub_modules=stub_modules
+            )
+        except ImportError as e:
+            # E.g. the module fails without the heavy dependency, so it imports it eagerly
+            errors, cumulative_us = [str(e)], 0
+
+        status = "FAIL" if errors else "ok"
+        print("%-60s %8d us  %s" % (full_name, cumulative_us, status))
+        for error in errors:
+            print("    " + error)
+        failed = failed or bool(errors)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
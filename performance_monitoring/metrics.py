@@ -0,0 +1,342 @@
+import os
+import time
+import logging
+import threading
+import functools
+
+from contextlib import contextmanager
+
+
+logger = logging.getLogger("infapi.plugins")
+
+# Upper bounds (in seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_state = {
+    "enabled": os.environ.get("INFAPI_METRICS", "0").lower() in ("1", "true", "yes"),
+    "tracing": os.environ.get("INFAPI_TRACING", "0").lower() in ("1", "true", "yes"),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_finished_spans = []
+_span_context = threading.local()
+
+# Finished spans kept in memory (the oldest ones are dropped)
+MAX_FINISHED_SPANS = 10000
+
+
+class Counter:
+    """
+    Monotonically increasing counter
+    """
+
+    def __init__(self, name, description=""):
+        self.name = name
+        self.description = description
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        with _lock:
+            self.value += amount
+
+
+class Histogram:
+    """
+    Histogram of observed values with cumulative buckets (Prometheus semantics)
+    """
+
+    def __init__(self, name, description="", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        with _lock:
+            self.count += 1
+            self.sum += value
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    self.bucket_counts[i] += 1
+                    break
+
+
+def enable_metrics(tracing=False):
+    """
+    Turns metrics collection on (and optionally span-style tracing)
+    Parameters:
+        - tracing as (bool): whether to record spans for timed blocks
+    """
+
+    _state["enabled"] = True
+    _state["tracing"] = tracing
+
+
+def disable_metrics():
+    """
+    Turns metrics collection and tracing off
+    """
+
+    _state["enabled"] = False
+    _state["tracing"] = False
+
+
+def is_enabled():
+    return _state["enabled"]
+
+
+def get_counter(name, description=""):
+    """
+    Returns the registered counter with the given name (creates it if needed)
+    Parameters:
+        - name as (str): metric name
+        - description as (str): help text of the metric
+    Returns:
+        - counter as (Counter): the counter object
+    """
+
+    with _lock:
+        counter = _counters.get(name)
+        if counter is None:
+            counter = _counters[name] = Counter(name, description)
+
+    return counter
+
+
+def get_histogram(name, description="", buckets=DEFAULT_BUCKETS):
+    """
+    Returns the registered histogram with the given name (creates it if needed)
+    Parameters:
+        - name as (str): metric name
+        - description as (str): help text of the metric
+        - buckets as (tuple of float): upper bounds of the buckets
+    Returns:
+        - histogram as (Histogram): the histogram object
+    """
+
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram(name, description, buckets)
+
+    return histogram
+
+
+def inc_counter(name, amount=1.0):
+    """
+    Increments the counter with the given name if metrics are enabled
+    """
+
+    if _state["enabled"]:
+        get_counter(name).inc(amount)
+
+
+@contextmanager
+def timer(name):
+    """
+    Context manager measuring duration of the block. The duration is observed
+    in the '<name>_seconds' histogram, calls and errors are counted in
+    '<name>_calls_total' and '<name>_errors_total'. Does nothing if metrics are disabled.
+    Parameters:
+        - name as (str): name of the measured operation
+    """
+
+    if not _state["enabled"]:
+        yield
+        return
+
+    span = _start_span(name) if _state["tracing"] else None
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        get_histogram(name + "_seconds").observe(duration)
+        get_counter(name + "_calls_total").inc()
+        if error is not None:
+            get_counter(name + "_errors_total").inc()
+        if span is not None:
+            _finish_span(span, duration, error)
+
+
+def timed(name=None):
+    """
+    Decorator measuring every call of the function with 'timer'
+    Parameters:
+        - name as (str): name of the operation (function name by default)
+    """
+
+    def decorator(func):
+        metric_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state["enabled"]:
+                return func(*args, **kwargs)
+            with timer(metric_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _start_span(name):
+    parent = getattr(_span_context, "current", None)
+    span = {
+        "name": name,
+        "trace_id": parent["trace_id"] if parent else os.urandom(8).hex(),
+        "span_id": os.urandom(8).hex(),
+        "parent_id": parent["span_id"] if parent else None,
+        "start_time": time.time(),
+        "duration": None,
+        "error": None,
+        "_parent": parent,
+    }
+    _span_context.current = span
+
+    return span
+
+
+def _finish_span(span, duration, error):
+    _span_context.current = span.pop("_parent")
+    span["duration"] = duration
+    if error is not None:
+        span["error"] = type(error).__name__
+
+    with _lock:
+        _finished_spans.append(span)
+        if len(_finished_spans) > MAX_FINISHED_SPANS:
+            del _finished_spans[0]
+
+    logger.debug("span %s took %.6f sec", span["name"], duration)
+
+
+def get_finished_spans(clear=False):
+    """
+    Returns the list of recorded spans (as dicts with name, trace_id, span_id,
+    parent_id, start_time, duration and error keys)
+    Parameters:
+        - clear as (bool): whether to forget returned spans
+    Returns:
+        - spans as (list of dicts): finished spans
+    """
+
+    with _lock:
+        spans = list(_finished_spans)
+        if clear:
+            del _finished_spans[:]
+
+    return spans
+
+
+def reset_metrics():
+    """
+    Removes all registered metrics and recorded spans
+    """
+
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        del _finished_spans[:]
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def generate_prometheus_text(prefix="infapi_"):
+    """
+    Returns all registered metrics in the Prometheus text exposition format
+    Parameters:
+        - prefix as (str): prefix added to the metrics' names
+    Returns:
+        - text as (str): metrics in the Prometheus text format
+    """
+
+    lines = []
+    with _lock:
+        for name in sorted(_counters):
+            counter = _counters[name]
+            full_name = prefix + name
+            if counter.description:
+                lines.append("# HELP %s %s" % (full_name, counter.description))
+            lines.append("# TYPE %s counter" % full_name)
+            lines.append("%s %s" % (full_name, _format_value(counter.value)))
+
+        for name in sorted(_histograms):
+            histogram = _histograms[name]
+            full_name = prefix + name
+            if histogram.description:
+                lines.append("# HELP %s %s" % (full_name, histogram.description))
+            lines.append("# TYPE %s histogram" % full_name)
+            cumulative = 0
+            for upper_bound, bucket_count in zip(histogram.buckets, histogram.bucket_counts):
+                cumulative += bucket_count
+                lines.append('%s_bucket{le="%s"} %d' % (full_name, _format_value(upper_bound), cumulative))
+            lines.append('%s_bucket{le="+Inf"} %d' % (full_name, histogram.count))
+            lines.append("%s_sum %s" % (full_name, _format_value(histogram.sum)))
+            lines.append("%s_count %d" % (full_name, histogram.count))
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(file_path, prefix="infapi_"):
+    """
+    Writes all registered metrics to the file (for the node_exporter textfile collector).
+    The file is replaced atomically so the collector never reads a partial file.
+    Parameters:
+        - file_path as (str): path to the output '.prom' file
+        - prefix as (str): prefix added to the metrics' names
+    """
+
+    tmp_path = "%s.%d.tmp" % (file_path, os.getpid())
+    with open(tmp_path, "w") as f:
+        f.write(generate_prometheus_text(prefix))
+    os.replace(tmp_path, file_path)
+
+
+def start_metrics_server(port=9100, addr="", prefix="infapi_"):
+    """
+    Starts HTTP server (in a daemon thread) exposing the metrics on '/metrics'
+    Parameters:
+        - port as (int): port to listen on
+        - addr as (str): address to bind
+        - prefix as (str): prefix added to the metrics' names
+    Returns:
+        - server as (HTTPServer): the running server (call 'shutdown()' to stop it)
+    """
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = generate_prometheus_text(prefix).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server
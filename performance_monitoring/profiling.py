@@ -0,0 +1,305 @@
+import os
+import sys
+import time
+import logging
+import threading
+import functools
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+
+logger = logging.getLogger("infapi.plugins")
+
+# Profiling modes:
+#   - "off": no profiling (default)
+#   - "trace": deterministic profiling with cProfile (writes '.pstats' and '.collapsed' files)
+#   - "sample": statistical profiling by a sampling thread (writes '.collapsed' file)
+PROFILING_MODES = ("off", "trace", "sample")
+
+_config = {
+    "mode": "off",
+    "output_dir": os.environ.get("INFAPI_PROFILE_DIR", "profiles"),
+    "sample_interval": float(os.environ.get("INFAPI_PROFILE_INTERVAL", "0.005")),
+    "tracemalloc": os.environ.get("INFAPI_PROFILE_MEMORY", "0").lower() in ("1", "true", "yes"),
+}
+
+# Only the outermost profiled call of a thread is captured (nested entry points,
+# e.g. 'get_trip_data' calling 'get_here_route_for_event', are part of its profile)
+_active = threading.local()
+_run_counter = [0]
+_run_counter_lock = threading.Lock()
+
+# tracemalloc is process-wide: it is started by the first profiled run needing it
+# and stopped when the last concurrent run finishes (unless it was started by someone else)
+_tracemalloc_state = {"users": 0, "owned": False}
+_tracemalloc_lock = threading.Lock()
+
+# Maximal depth of the stacks restored from the cProfile call graph
+MAX_COLLAPSED_DEPTH = 64
+
+
+def configure_profiling(mode=None, output_dir=None, sample_interval=None, tracemalloc=None):
+    """
+    Changes profiling settings (initial values are taken from the INFAPI_PROFILE,
+    INFAPI_PROFILE_DIR, INFAPI_PROFILE_INTERVAL and INFAPI_PROFILE_MEMORY environment variables)
+    Parameters:
+        - mode as (str): "off", "trace" (cProfile) or "sample" (sampling profiler)
+        - output_dir as (str): directory for the profiles
+        - sample_interval as (float): sampling interval in seconds
+        - tracemalloc as (bool): whether to take tracemalloc snapshots
+    """
+
+    if mode is not None:
+        _config["mode"] = _check_mode(mode)
+    if output_dir is not None:
+        _config["output_dir"] = output_dir
+    if sample_interval is not None:
+        _config["sample_interval"] = sample_interval
+    if tracemalloc is not None:
+        _config["tracemalloc"] = tracemalloc
+
+
+def _check_mode(mode):
+    if mode not in PROFILING_MODES:
+        raise ValueError("Profiling mode must be one of %s!" % (PROFILING_MODES,))
+    return mode
+
+
+class StackSampler:
+    """
+    Periodically samples the call stack of the given thread and counts
+    the collapsed stacks ('outer;...;inner' lines used by flamegraph tools)
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append("%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename),
+                                              code.co_firstlineno))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(frames))] += 1
+
+    def write_collapsed(self, file_path):
+        """
+        Writes the collapsed stacks ('stack count' lines) readable by flamegraph.pl/speedscope
+        """
+
+        with open(file_path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write("%s %d\n" % (stack, count))
+
+
+def _start_tracemalloc():
+    import tracemalloc
+
+    with _tracemalloc_lock:
+        if _tracemalloc_state["users"] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_state["owned"] = True
+        _tracemalloc_state["users"] += 1
+
+    return tracemalloc.take_snapshot()
+
+
+def _stop_tracemalloc():
+    import tracemalloc
+
+    with _tracemalloc_lock:
+        # The snapshot is taken before releasing, so a concurrent run can't stop tracing under it
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        _tracemalloc_state["users"] -= 1
+        if _tracemalloc_state["users"] == 0 and _tracemalloc_state["owned"]:
+            tracemalloc.stop()
+            _tracemalloc_state["owned"] = False
+
+    return snapshot
+
+
+def _get_output_prefix(name):
+    with _run_counter_lock:
+        _run_counter[0] += 1
+        run_idx = _run_counter[0]
+
+    os.makedirs(_config["output_dir"], exist_ok=True)
+    file_name = "%s-%s-%d-%d" % (name, time.strftime("%Y%m%d-%H%M%S"), os.getpid(), run_idx)
+
+    return os.path.join(_config["output_dir"], file_name)
+
+
+@contextmanager
+def profiled(name, mode=None):
+    """
+    Context manager profiling the block according to the configured mode. Every run
+    writes its own files into the output directory:
+        - '<prefix>.pstats' (trace mode) - cProfile stats for pstats/snakeviz
+        - '<prefix>.collapsed' - collapsed stacks for flamegraph tools (sampled in
+          sample mode, restored from the cProfile call graph in trace mode)
+        - '<prefix>.tracemalloc.txt' - top allocations (if tracemalloc is enabled)
+    Profiling failures are logged and never change the outcome of the profiled block.
+    Parameters:
+        - name as (str): name of the profiled operation (used in the file names)
+        - mode as (str): overrides the configured profiling mode
+    """
+
+    mode = _check_mode(mode or _config["mode"])
+    if mode == "off" or getattr(_active, "running", False):
+        yield
+        return
+
+    _active.running = True
+    prefix = profiler = sampler = snapshot_before = None
+    trace_malloc = _config["tracemalloc"]
+    try:
+        prefix = _get_output_prefix(name)
+        if trace_malloc:
+            snapshot_before = _start_tracemalloc()
+        if mode == "trace":
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            sampler = StackSampler(threading.get_ident(), _config["sample_interval"])
+            sampler.start()
+    except Exception:
+        logger.exception("Failed to start profiling of '%s'", name)
+
+    try:
+        yield
+    finally:
+        try:
+            _finish_profiling(prefix, profiler, sampler, snapshot_before, trace_malloc)
+            logger.debug("Profile of '%s' is written to %s.*", name, prefix)
+        except Exception:
+            logger.exception("Failed to write profile of '%s'", name)
+        finally:
+            _active.running = False
+
+
+def _finish_profiling(prefix, profiler, sampler, snapshot_before, trace_malloc):
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(prefix + ".pstats")
+        _write_collapsed_from_profile(profiler, prefix + ".collapsed")
+    if sampler is not None:
+        sampler.stop()
+        sampler.write_collapsed(prefix + ".collapsed")
+
+    if trace_malloc and snapshot_before is not None:
+        snapshot_after = _stop_tracemalloc()
+        if snapshot_after is not None:
+            _write_tracemalloc_diff(snapshot_before, snapshot_after, prefix + ".tracemalloc.txt")
+
+
+def _write_collapsed_from_profile(profiler, file_path):
+    """
+    Writes collapsed stacks restored from the cProfile call graph. cProfile keeps only
+    caller -> callee edges, so the time of a function called from several places is
+    split between its callers' stacks proportionally to the edges' cumulative time
+    """
+
+    import pstats
+
+    stats = pstats.Stats(profiler).stats
+    callees = defaultdict(dict)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge
+
+    def get_label(func):
+        file_name, line_no, func_name = func
+        return "%s (%s:%d)" % (func_name, os.path.basename(file_name), line_no)
+
+    collapsed = Counter()
+
+    def walk(func, path, self_time, cum_time):
+        path = path + [get_label(func)]
+        collapsed[";".join(path)] += self_time
+        func_cum_time = stats[func][3]
+        if len(path) >= MAX_COLLAPSED_DEPTH or not func_cum_time:
+            return
+        fraction = cum_time / func_cum_time
+        for callee, (_, _, edge_self_time, edge_cum_time) in callees[func].items():
+            if get_label(callee) not in path:
+                walk(callee, path, edge_self_time * fraction, edge_cum_time * fraction)
+
+    for func, (_, _, self_time, cum_time, callers) in stats.items():
+        if not callers:
+            walk(func, [], self_time, cum_time)
+
+    with open(file_path, "w") as f:
+        for stack, seconds in collapsed.most_common():
+            microseconds = int(round(seconds * 1e6))
+            if microseconds:
+                f.write("%s %d\n" % (stack, microseconds))
+
+
+def _write_tracemalloc_diff(snapshot_before, snapshot_after, file_path, limit=50):
+    stats = snapshot_after.compare_to(snapshot_before, "lineno")
+    with open(file_path, "w") as f:
+        for stat in stats[:limit]:
+            f.write("%s\n" % stat)
+
+
+def profile_function(name=None):
+    """
+    Decorator profiling every call of the function with 'profiled'
+    (does nothing while the profiling mode is "off")
+    Parameters:
+        - name as (str): name of the operation (function name by default)
+    """
+
+    def decorator(func):
+        profile_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _config["mode"] == "off":
+                return func(*args, **kwargs)
+            with profiled(profile_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _get_env_mode():
+    """
+    Returns profiling mode set by the INFAPI_PROFILE environment variable. The switch
+    spellings of the other INFAPI_* variables are accepted too ("1", "true", "yes"
+    mean "trace"), an unknown value turns the profiling off instead of breaking the import
+    """
+
+    value = os.environ.get("INFAPI_PROFILE", "off").strip().lower()
+    if value in PROFILING_MODES:
+        return value
+    if value in ("1", "true", "yes", "on"):
+        return "trace"
+    if value not in ("", "0", "false", "no"):
+        logger.warning("Unknown INFAPI_PROFILE value %r (expected one of %s), profiling is off",
+                       value, PROFILING_MODES)
+
+    return "off"
+
+
+configure_profiling(mode=_get_env_mode())
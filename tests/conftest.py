@@ -0,0 +1,10 @@
+import os
+import sys
+
+
+# The library modules use relative imports, so they are imported as submodules of the
+# package directory (its name is the checkout directory name): put its parent on the path
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if os.path.dirname(PACKAGE_DIR) not in sys.path:
+    sys.path.insert(0, os.path.dirname(PACKAGE_DIR))
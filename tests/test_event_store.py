@@ -0,0 +1,89 @@
+import os
+import importlib
+
+import pytest
+
+
+PACKAGE_NAME = os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+event_store = importlib.import_module(PACKAGE_NAME + ".json_process.event_store")
+
+
+def get_event(user_id="user-1", event_id="event-1", lat=52.52, lon=13.40, start_time=1607284225000):
+    return {
+        "type": "DayPlanPlace",
+        "user_id": user_id,
+        "device_id": "device-1",
+        "attributes": {
+            "id": event_id,
+            "title": "Place " + event_id,
+            "lat": lat,
+            "lon": lon,
+            "location_name": "Berlin",
+            "communication_info": None,
+            "start_time": start_time,
+            "timezone": 3600000,
+            "duration_minutes": 30,
+            "attendee_status": None,
+            "is_organiser": None,
+            "valid": True,
+        },
+    }
+
+
+def get_events_list():
+    return [
+        get_event(event_id="event-1", lat=52.52, lon=13.40, start_time=1607284225000),
+        get_event(event_id="event-2", lat=52.50, lon=13.45, start_time=1607287825000),
+    ]
+
+
+def test_unknown_event_type_is_rejected():
+    event = get_event()
+    event["type"] = "Bogus"
+
+    with pytest.raises(event_store.EventStoreError, match="unknown type"):
+        event_store.EventStore.from_events([event])
+
+
+def test_out_of_range_value_is_rejected():
+    with pytest.raises(event_store.EventStoreError, match="out of range"):
+        event_store.EventStore.from_events([get_event(lat=91.0)])
+
+
+def test_missing_attribute_is_rejected():
+    event = get_event()
+    del event["attributes"]["valid"]
+
+    with pytest.raises(event_store.EventStoreError, match="misses"):
+        event_store.EventStore.from_events([event])
+
+
+def test_views_are_dict_compatible():
+    pytest.importorskip("pyarrow")
+
+    events_list = get_events_list()
+    store = event_store.EventStore.from_events(events_list)
+    views = list(store.iter_events())
+
+    assert "attributes" in views[0] and "user_id" in views[0]
+    assert "place_id" not in views[0]["attributes"]
+    assert "lat" in views[0]["attributes"]
+    assert dict(views[0]["attributes"]) == events_list[0]["attributes"]
+    assert dict(views[0], attributes=dict(views[0]["attributes"])) == events_list[0]
+
+
+def test_map_is_rendered_from_views():
+    pytest.importorskip("pyarrow")
+    pytest.importorskip("folium")
+
+    folium_maps = importlib.import_module(PACKAGE_NAME + ".folium_mapping.folium_maps")
+    batch_render = importlib.import_module(PACKAGE_NAME + ".folium_mapping.batch_render")
+
+    events_list = get_events_list()
+    views = list(event_store.EventStore.from_events(events_list).with_coords().iter_events())
+
+    map_html = folium_maps.get_map_with_events(views).get_root().render()
+
+    assert "event-1" in map_html and "event-2" in map_html
+    assert batch_render.get_events_map_hash(views) == batch_render.get_events_map_hash(events_list)
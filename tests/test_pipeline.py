@@ -0,0 +1,153 @@
+import os
+import time
+import importlib
+import threading
+
+import pytest
+
+
+PACKAGE_NAME = os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pipeline = importlib.import_module(PACKAGE_NAME + ".batch_processing.pipeline")
+
+# The pipeline must finish (or fail) in this time, otherwise it is considered hanging
+TIMEOUT = 60
+
+
+# Stage functions are module-level to be picklable for the "cpu" stages
+
+def double(x):
+    return 2 * x
+
+
+def increment(x):
+    return x + 1
+
+
+def fail_on_three(x):
+    if x == 3:
+        raise ValueError("bad item %d" % x)
+    return x
+
+
+def exit_on_three(x):
+    if x == 3:
+        # Kills the worker process like OOM killer or segfault would
+        os._exit(1)
+    return x
+
+
+def slow_increment(x):
+    time.sleep(0.01)
+    return x + 1
+
+
+def fail_after_two_items():
+    yield 1
+    yield 2
+    raise RuntimeError("input is broken")
+
+
+def run_with_timeout(func):
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = func()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    assert not thread.is_alive(), "The pipeline hangs"
+
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def test_items_pass_all_stages_in_order():
+    p = pipeline.Pipeline([
+        pipeline.Stage("double", double, kind="cpu", workers=2, queue_size=2),
+        pipeline.Stage("increment", slow_increment, kind="io", workers=4, queue_size=2),
+    ])
+
+    results = run_with_timeout(lambda: list(p.run(range(20))))
+
+    assert results == [2 * x + 1 for x in range(20)]
+    stats = p.get_stats()
+    assert stats["double"]["processed"] == 20 and stats["increment"]["processed"] == 20
+    assert stats["double"]["errors"] == 0
+
+
+def test_failed_item_is_yielded_in_place():
+    p = pipeline.Pipeline([
+        pipeline.Stage("check", fail_on_three, kind="io", workers=2),
+        pipeline.Stage("increment", increment, kind="io", workers=2),
+    ])
+
+    results = run_with_timeout(lambda: list(p.run(range(10))))
+
+    assert len(results) == 10
+    failure = results[3]
+    assert isinstance(failure, pipeline.StageFailure)
+    assert failure.stage_name == "check" and isinstance(failure.error, ValueError)
+    assert results[:3] + results[4:] == [x + 1 for x in range(10) if x != 3]
+    stats = p.get_stats()
+    assert stats["check"]["errors"] == 1 and stats["increment"]["processed"] == 9
+
+
+def test_stop_on_error_raises_pipeline_error():
+    p = pipeline.Pipeline([
+        pipeline.Stage("check", fail_on_three, kind="io", workers=2),
+        pipeline.Stage("increment", increment, kind="io", workers=2),
+    ])
+
+    with pytest.raises(pipeline.PipelineError, match="Stage 'check' failed"):
+        run_with_timeout(lambda: list(p.run(range(10), stop_on_error=True)))
+
+
+def test_input_failure_ends_stream():
+    p = pipeline.Pipeline([pipeline.Stage("increment", increment, kind="io", workers=2)])
+
+    results = run_with_timeout(lambda: list(p.run(fail_after_two_items())))
+
+    assert results[:2] == [2, 3]
+    assert len(results) == 3 and results[2].stage_name == pipeline.INPUT_STAGE_NAME
+
+    with pytest.raises(pipeline.PipelineError, match=pipeline.INPUT_STAGE_NAME):
+        run_with_timeout(lambda: list(p.run(fail_after_two_items(), stop_on_error=True)))
+
+
+def test_dead_worker_process_doesnt_hang_pipeline():
+    p = pipeline.Pipeline([
+        pipeline.Stage("exit", exit_on_three, kind="cpu", workers=1, queue_size=2),
+        pipeline.Stage("increment", increment, kind="io", workers=2, queue_size=2),
+    ])
+
+    results = run_with_timeout(lambda: list(p.run(range(10))))
+
+    # The items sent to the broken pool fail, but every item gets its output
+    assert len(results) == 10 and results[:3] == [1, 2, 3]
+    assert all(isinstance(result, pipeline.StageFailure) for result in results[3:])
+
+    with pytest.raises(pipeline.PipelineError, match="Stage 'exit' failed"):
+        run_with_timeout(lambda: list(p.run(range(10), stop_on_error=True)))
+
+
+def test_early_close_stops_pipeline():
+    p = pipeline.Pipeline([
+        pipeline.Stage("increment", slow_increment, kind="io", workers=2, queue_size=2),
+        pipeline.Stage("double", double, kind="io", workers=2, queue_size=2),
+    ])
+
+    def take_three():
+        results = p.run(range(1000))
+        first = [next(results) for _ in range(3)]
+        results.close()
+        return first
+
+    assert run_with_timeout(take_three) == [2, 4, 6]
+    # The remaining items are skipped instead of being processed
+    assert p.get_stats()["increment"]["processed"] < 1000
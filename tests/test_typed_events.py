@@ -0,0 +1,107 @@
+import os
+import json
+import pickle
+import importlib
+
+import pytest
+
+
+PACKAGE_NAME = os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+typed_events = importlib.import_module(PACKAGE_NAME + ".json_process.typed_events")
+folium_maps = importlib.import_module(PACKAGE_NAME + ".folium_mapping.folium_maps")
+json_validation = importlib.import_module(PACKAGE_NAME + ".json_process.json_validation")
+
+# Part of the input schema checked by the tests
+INPUT_SCHEMA = {
+    "type": "object",
+    "required": ["events"],
+    "properties": {
+        "events": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["attributes", "type", "user_id", "device_id"],
+                "properties": {
+                    "user_id": {"type": "string", "minLength": 1},
+                    "attributes": {"type": "object", "required": ["id", "lat", "lon"]},
+                },
+            },
+        },
+    },
+}
+
+
+def get_event_data(**extra_attributes):
+    attributes = {
+        "id": "event-1",
+        "title": "Place",
+        "lat": 52.52,
+        "lon": 13.40,
+        "location_name": "Berlin",
+        "communication_info": None,
+        "start_time": 1607284225000,
+        "timezone": 3600000,
+        "duration_minutes": 30,
+        "attendee_status": None,
+        "is_organiser": None,
+        "valid": True,
+    }
+    attributes.update(extra_attributes)
+
+    return {"type": "DayPlanPlace", "user_id": "user-1", "device_id": "device-1", "attributes": attributes}
+
+
+def test_event_is_decoded_to_typed_objects():
+    event_data = get_event_data()
+
+    event = typed_events.decode_events(json.dumps({"events": [event_data]}))[0]
+
+    assert event.attributes.lat == 52.52 and event["attributes"]["id"] == "event-1"
+    assert dict(event.attributes) == event_data["attributes"]
+    assert pickle.loads(pickle.dumps(event)) == event
+
+
+def test_extra_attributes_are_kept():
+    event_data = get_event_data(place_id="place-1")
+
+    event = typed_events.decode_event(event_data)
+
+    assert "place_id" in event["attributes"]
+    assert event["attributes"]["place_id"] == "place-1"
+    assert dict(event["attributes"]) == event_data["attributes"]
+    assert folium_maps.get_event_popup(event) == folium_maps.get_event_popup(event_data) == "place-1"
+    assert folium_maps.get_event_popup(typed_events.decode_event(get_event_data())) == "event-1"
+
+
+def test_integral_float_is_accepted_for_integer_field():
+    event = typed_events.decode_event(get_event_data(start_time=1607284225000.0))
+
+    assert event.attributes.start_time == 1607284225000 and type(event.attributes.start_time) is int
+
+    with pytest.raises(json_validation.JsonValidationError, match="start_time"):
+        typed_events.decode_event(get_event_data(start_time=1607284225000.5))
+
+
+def test_typed_events_pass_schema_validation():
+    pytest.importorskip("jsonschema")
+
+    events_list = [typed_events.decode_event(get_event_data(place_id="place-1"))]
+
+    assert json_validation.get_input_events_list({"events": events_list}, INPUT_SCHEMA) is events_list
+
+    invalid_event = typed_events.decode_event(dict(get_event_data(), user_id=""))
+    with pytest.raises(json_validation.JsonValidationError):
+        json_validation.validate_my_json({"events": [invalid_event]}, INPUT_SCHEMA)
+
+
+def test_event_store_is_built_from_typed_events():
+    pytest.importorskip("jsonschema")
+    pytest.importorskip("pyarrow")
+
+    event_store = importlib.import_module(PACKAGE_NAME + ".json_process.event_store")
+    events_list = [typed_events.decode_event(get_event_data())]
+
+    store = event_store.EventStore.from_events(events_list, input_schema=INPUT_SCHEMA)
+
+    assert len(store) == 1 and dict(next(store.iter_events())["attributes"]) == dict(events_list[0].attributes)
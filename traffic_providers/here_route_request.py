@@ -1,13 +1,16 @@
-import requests
 import datetime 
-import pytz 
 import logging
 
 logger = logging.getLogger("infapi.plugins")
 
 from ..exceptions import HereResponseError, TsTypeValueError
+from ..performance_monitoring.metrics import timed, timer
+from ..performance_monitoring.profiling import profile_function
+from ..exceptions_handling.exception_telemetry import track_exceptions
+from ..json_process.typed_events import loads_json, get_route_summary
 
 
+@timed("get_here_route_for_event")
 def get_here_route_for_event(start_coords, end_coords, ts_sec, tz_str, 
                              here_addr, app_id, app_code, ts_type="departure"):
     """
@@ -40,7 +43,9 @@ def get_here_route_for_event(start_coords, end_coords, ts_sec, tz_str,
     else:
         params["departure"] = get_local_iso_time(ts_sec, tz_str)
 
-    # request to HERE
+    # request to HERE ('requests' is imported on the first use to keep the module import cheap)
+    import requests
+    
     response = requests.get(here_addr, params=params)
     
     return response
@@ -56,6 +61,8 @@ def get_local_iso_time(utc_ts_seconds, tz_str):
         - date_time_iso as (str): local datetime in ISO format
     """
 
+    import pytz
+    
     timezone = pytz.timezone(tz_str)
     tz_hours = get_tz_hours_from_str(tz_str)
     
@@ -68,6 +75,8 @@ def get_local_iso_time(utc_ts_seconds, tz_str):
 
 def get_tz_hours_from_str(tz_str):
     
+    import pytz
+    
     loc_now = datetime.datetime.now(pytz.timezone(tz_str))
     tz_hours = loc_now.utcoffset().total_seconds()/3600
     
@@ -102,14 +111,17 @@ def getInitialParametersForRequestToHERE(mode="fastest;car;traffic:enabled;",
     return params
 
 
+@track_exceptions()
+@profile_function("get_trip_data")
+@timed("get_trip_data")
 def get_trip_data(prev_event, next_event, tz_str, here_addr, app_id, app_code,ts_type="arrival"):
     """
     Returns trip to go from origin place to the destination. Depending on the "ts_type" parameter,
     uses time of departure from the previous event end (ts_type="departure") or time of arrival
     at the beginning of the next event (ts_type="arrival")
     Parameters:
-        - prev_event as (dict): data about the given event
-        - next_event as (dict): data about the next_event 
+        - prev_event as (dict or Event): data about the given event
+        - next_event as (dict or Event): data about the next_event 
         - tz_str as (str): timezone as string
         - here_addr as (str): url for the HERE request
         - app_id as (str): application id
@@ -144,17 +156,18 @@ def get_trip_data(prev_event, next_event, tz_str, here_addr, app_id, app_code,ts
                                     here_addr, app_id, app_code, ts_type=ts_type)
 
     try:  
-        here_resp = resp.json()
+        with timer("here_json_decode"):
+            here_resp = loads_json(resp.content)
     except HereResponseError:
         logger.warning('The returned response is not a JSON!')
     
     # Validate the HERE response
     if resp.status_code == 200:
 
-        here_resp_summary = here_resp["response"]["route"][0]["summary"]
+        here_resp_summary = get_route_summary(here_resp)
 
-        here_route_len_m = here_resp_summary["distance"]
-        here_route_time_sec = here_resp_summary["travelTime"]
+        here_route_len_m = here_resp_summary.distance
+        here_route_time_sec = here_resp_summary.travelTime
         
         if ts_type == "arrival":
             dep_time_ts_ms = time_param_ms - 1000 * here_route_time_sec